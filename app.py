@@ -1,11 +1,14 @@
-from flask import Flask, request, jsonify, send_file, redirect, session, url_for
-import json
+from flask import Flask, Response, request, jsonify, send_file, redirect, session, url_for
+from flask.json.provider import DefaultJSONProvider
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 import secrets
 import urllib.parse
 
+import orjson
 import requests
 from dotenv import load_dotenv
 
@@ -19,8 +22,21 @@ os.makedirs(SNAPSHOT_DIR, exist_ok=True)
 # Load local .env file if present
 load_dotenv(os.path.join(BASE_DIR, ".env"))
 
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson, so every jsonify call uses it."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj, option=orjson.OPT_NON_STR_KEYS, default=self.default
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__, static_folder='.', static_url_path='')
 app.secret_key = os.environ.get("SECRET_KEY") or secrets.token_hex(32)
+app.json = OrjsonProvider(app)
 
 GITHUB_CLIENT_ID = (os.environ.get("GITHUB_CLIENT_ID") or "").strip()
 GITHUB_CLIENT_SECRET = (os.environ.get("GITHUB_CLIENT_SECRET") or "").strip()
@@ -209,17 +225,29 @@ def analyze():
         snapshot_meta["file_count"] = len(city_data)
 
         snapshot_path = os.path.join(SNAPSHOT_DIR, f"{snapshot_id}.json")
-        with open(snapshot_path, 'w') as f:
-            json.dump({"meta": snapshot_meta, "data": city_data}, f)
+        with open(snapshot_path, 'wb') as f:
+            f.write(orjson.dumps({"meta": snapshot_meta, "data": city_data}))
+        # Sidecar metadata file so /api/snapshots never has to parse full payloads
+        meta_path = os.path.join(SNAPSHOT_DIR, f"{snapshot_id}.meta.json")
+        with open(meta_path, 'wb') as f:
+            f.write(orjson.dumps(snapshot_meta))
+        # New snapshot on disk: drop cached payloads/metadata
+        _read_snapshot_bytes.cache_clear()
+        _snap_cache.pop(meta_path, None)
 
         print(f"[PRO] Snapshot saved at {snapshot_path}", file=sys.stderr)
 
-        return jsonify({
-            'success': True,
-            'data': city_data,
-            'snapshot': snapshot_meta,
-            'message': "Analysis complete",
-        })
+        # Stream the response: the client sees success/snapshot immediately
+        # and the (potentially huge) data array is serialized one item at a
+        # time instead of as a single in-memory string.
+        def generate():
+            yield b'{"success":true,"snapshot":' + orjson.dumps(snapshot_meta)
+            yield b',"data":['
+            for i, item in enumerate(city_data):
+                yield (b',' if i else b'') + orjson.dumps(item)
+            yield b'],"message":"Analysis complete"}'
+
+        return Response(generate(), mimetype='application/json')
 
     except Exception as e:
         print(f"[PRO] Exception: {str(e)}", file=sys.stderr)
@@ -232,13 +260,69 @@ def get_current_data():
     Get the latest city data in this pro instance (not tied to a snapshot).
     """
     data_file = os.path.join(BASE_DIR, 'city_data2.json')
-    if os.path.exists(data_file):
-        try:
-            with open(data_file, 'r') as f:
-                return jsonify(json.load(f))
-        except json.JSONDecodeError:
-            return jsonify({'error': 'The city_data2.json file is not valid JSON.'}), 400
-    return jsonify([])
+    if not os.path.exists(data_file):
+        return jsonify([])
+    # The file is already JSON; serve it as-is with ETag/Last-Modified so
+    # repeat polls get 304s instead of a parse + re-serialize roundtrip
+    return send_file(
+        data_file,
+        mimetype='application/json',
+        conditional=True,
+        etag=True,
+        last_modified=os.path.getmtime(data_file),
+    )
+
+
+# Snapshot files are immutable once written, so parsed metadata can be cached
+# in-process; mtime comparison catches the rare rewrite.
+_snap_cache: dict = {}
+
+
+def _load_snapshot_meta(meta_path):
+    """Load a sidecar meta file, reusing the cached parse while mtime is unchanged."""
+    mtime = os.stat(meta_path).st_mtime
+    cached = _snap_cache.get(meta_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(meta_path, 'rb') as f:
+        meta = orjson.loads(f.read())
+    _snap_cache[meta_path] = (mtime, meta)
+    return meta
+
+
+@lru_cache(maxsize=128)
+def _read_snapshot_bytes(snapshot_id):
+    """Return the raw JSON bytes of a snapshot, or None if it does not exist."""
+    path = os.path.join(SNAPSHOT_DIR, f"{snapshot_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _ensure_snapshot_meta(snapshot_name):
+    """
+    Return the path of the sidecar .meta.json for a snapshot, creating it
+    from the legacy full payload if it does not exist yet (one-time migration).
+    """
+    snapshot_id = snapshot_name[:-len('.json')]
+    meta_path = os.path.join(SNAPSHOT_DIR, f"{snapshot_id}.meta.json")
+    if not os.path.exists(meta_path):
+        path = os.path.join(SNAPSHOT_DIR, snapshot_name)
+        with open(path, 'rb') as f:
+            payload = orjson.loads(f.read())
+        with open(meta_path, 'wb') as f:
+            f.write(orjson.dumps(payload.get('meta', {})))
+    return meta_path
+
+
+def _load_meta_for(snapshot_name):
+    """Load one snapshot's sidecar metadata, returning None on failure."""
+    try:
+        return _load_snapshot_meta(_ensure_snapshot_meta(snapshot_name))
+    except Exception as e:
+        print(f"[PRO] Failed to load snapshot {snapshot_name}: {e}", file=sys.stderr)
+        return None
 
 
 @app.route('/api/snapshots', methods=['GET'])
@@ -247,21 +331,19 @@ def list_snapshots():
     guard = _login_required()
     if guard:
         return guard
+    names = [
+        name for name in sorted(os.listdir(SNAPSHOT_DIR))
+        if name.endswith('.json') and not name.endswith('.meta.json')
+    ]
     snapshots = []
-    for name in sorted(os.listdir(SNAPSHOT_DIR)):
-        if not name.endswith('.json'):
-            continue
-        path = os.path.join(SNAPSHOT_DIR, name)
-        try:
-            with open(path, 'r') as f:
-                payload = json.load(f)
-            meta = payload.get('meta', {})
-            snapshots.append(meta)
-        except Exception as e:
-            print(f"[PRO] Failed to load snapshot {name}: {e}", file=sys.stderr)
+    if names:
+        # Sidecar reads are I/O-bound, so overlap them across threads;
+        # the mtime cache means warm entries never touch the parser
+        with ThreadPoolExecutor(max_workers=min(16, len(names))) as executor:
+            snapshots = [m for m in executor.map(_load_meta_for, names) if m is not None]
     # Sort newest first
     snapshots.sort(key=lambda s: s.get('id', ''), reverse=True)
-    return jsonify(snapshots)
+    return Response(orjson.dumps(snapshots), mimetype='application/json')
 
 
 @app.route('/api/snapshots/<snapshot_id>', methods=['GET'])
@@ -270,12 +352,10 @@ def get_snapshot(snapshot_id):
     guard = _login_required()
     if guard:
         return guard
-    path = os.path.join(SNAPSHOT_DIR, f"{snapshot_id}.json")
-    if not os.path.exists(path):
+    payload = _read_snapshot_bytes(snapshot_id)
+    if payload is None:
         return jsonify({'error': 'Snapshot not found'}), 404
-    with open(path, 'r') as f:
-        payload = json.load(f)
-    return jsonify(payload)
+    return Response(payload, mimetype='application/json')
 
 
 @app.route('/api/snapshots/<snapshot_id>/risk', methods=['GET'])
@@ -290,8 +370,8 @@ def get_snapshot_risk(snapshot_id):
     path = os.path.join(SNAPSHOT_DIR, f"{snapshot_id}.json")
     if not os.path.exists(path):
         return jsonify({'error': 'Snapshot not found'}), 404
-    with open(path, 'r') as f:
-        payload = json.load(f)
+    with open(path, 'rb') as f:
+        payload = orjson.loads(f.read())
     data = payload.get('data', [])
     enriched = []
     for rec in data:
@@ -303,7 +383,7 @@ def get_snapshot_risk(snapshot_id):
             "anomaly_score": rec.get("anomaly_score", 0.0),
         })
     enriched.sort(key=lambda r: r.get("risk_score", 0.0), reverse=True)
-    return jsonify(enriched)
+    return Response(orjson.dumps(enriched), mimetype='application/json')
 
 
 @app.route('/api/my_repos', methods=['GET'])
@@ -395,10 +475,10 @@ def diff_snapshots():
     if not os.path.exists(path1) or not os.path.exists(path2):
         return jsonify({'error': 'One or both snapshots not found'}), 404
 
-    with open(path1, 'r') as f:
-        data1 = json.load(f)['data']
-    with open(path2, 'r') as f:
-        data2 = json.load(f)['data']
+    with open(path1, 'rb') as f:
+        data1 = orjson.loads(f.read())['data']
+    with open(path2, 'rb') as f:
+        data2 = orjson.loads(f.read())['data']
 
     files1 = {f['name']: f for f in data1}
     files2 = {f['name']: f for f in data2}
@@ -418,11 +498,11 @@ def diff_snapshots():
                     'new_data': f2,
                 })
 
-    return jsonify({
+    return Response(orjson.dumps({
         'added': added,
         'removed': removed,
         'modified': modified,
-    })
+    }), mimetype='application/json')
 
 
 if __name__ == '__main__':
@@ -1,13 +1,14 @@
+import hashlib
 import os
-import json
+import re
 import sys
-import squarify
-import requests
+import numpy as np
+import orjson
 import lizard
 import subprocess
 import tempfile
 import shutil
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 
 # All file extensions supported by lizard
 SUPPORTED_EXTENSIONS = [
@@ -20,42 +21,85 @@ SUPPORTED_EXTENSIONS = [
     ".vb", ".vbs", ".gd"
 ]
 
+# Frozen set for O(1) extension membership tests in the directory walk
+EXT_SET = frozenset(SUPPORTED_EXTENSIONS)
+
+# Complexity buckets for building colors: <=5, <=15, <=30, <=50, >50
+COMPLEXITY_BINS = (6, 16, 31, 51)
+COMPLEXITY_COLORS = ("#00ffcc", "#00ff88", "#FFC300", "#ff9900", "#ff4444")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Persistent cache of lizard metrics keyed by content hash, so re-analyzing
+# a repo only tokenizes files that actually changed between snapshots
+CACHE_DIR = os.path.join(BASE_DIR, '.lizard_cache')
+
 # GitHub token - set via environment variable or create one at https://github.com/settings/tokens
 GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN', None)
 MAX_FILES = 2000
-MAX_WORKERS = 20
+# lizard parsing is CPU-bound, so parallelism is one worker process per core
+MAX_WORKERS = os.cpu_count() or 4
 
 # Global repo root used for git-based churn analysis
 REPO_ROOT = None
 
+
+def _init_worker(repo_root):
+    """Propagate the cloned repo root into analyzer worker processes."""
+    global REPO_ROOT
+    REPO_ROOT = repo_root
+
+# Strips the github.com prefix (https or ssh), a trailing .git and a
+# trailing slash in one pass; compiled once at import
+_GITHUB_URL_RE = re.compile(
+    r'^(?:https?://github\.com/|git@github\.com:)?(.+?)(?:\.git)?/?$'
+)
+
+
 def get_github_repo_info(url):
     """Parse GitHub URL to owner/repo."""
-    url = url.rstrip('/')
-    if url.startswith('https://github.com/'):
-        url = url.replace('https://github.com/', '')
-    if url.startswith('git@github.com:'):
-        url = url.replace('git@github.com:', '')
-    if url.endswith('.git'):
-        url = url[:-4]
-    parts = url.split('/')
+    parts = _GITHUB_URL_RE.match(url).group(1).split('/')
     return parts[0], parts[1]
 
 
 def clone_repository(repo_url, token):
-    """Clone a repository into a temporary directory."""
+    """Clone a repository into a temporary directory.
+
+    Uses a shallow, single-branch partial clone (blobs over 1 MiB are never
+    fetched since lizard would not analyze them anyway) and a sparse checkout
+    restricted to the supported source extensions, so unsupported files are
+    neither downloaded nor written to disk.
+    """
     temp_dir = tempfile.mkdtemp()
-    
+
     # Construct the clone URL with the token for authentication
     if token:
-        clone_url = f"https://{token}@github.com/{get_github_repo_info(repo_url)[0]}/{get_github_repo_info(repo_url)[1]}.git"
+        owner, repo = get_github_repo_info(repo_url)
+        clone_url = f"https://{token}@github.com/{owner}/{repo}.git"
     else:
         clone_url = repo_url
 
     print(f"[PRO] Cloning repository {repo_url} into {temp_dir}...", flush=True)
-    
+
     try:
         subprocess.run(
-            ['git', 'clone', '--depth', '1', clone_url, temp_dir],
+            ['git', '-c', 'protocol.version=2', 'clone',
+             '--depth=1', '--single-branch', '--no-tags',
+             '--filter=blob:limit=1m', '--no-checkout',
+             clone_url, temp_dir],
+            check=True,
+            capture_output=True,
+            text=True
+        )
+        subprocess.run(
+            ['git', '-C', temp_dir, 'sparse-checkout', 'set', '--no-cone']
+            + [f'*{ext}' for ext in SUPPORTED_EXTENSIONS],
+            check=True,
+            capture_output=True,
+            text=True
+        )
+        subprocess.run(
+            ['git', '-C', temp_dir, 'checkout'],
             check=True,
             capture_output=True,
             text=True
@@ -70,77 +114,197 @@ def clone_repository(repo_url, token):
 def get_source_files_from_local(local_repo_path, max_files=MAX_FILES):
     """Fetch all supported source files from a local directory."""
     source_files = []
-    for root, _, files in os.walk(local_repo_path):
-        # Exclude .git directory
-        if '.git' in root:
-            continue
-        
-        for file in files:
-            if any(file.endswith(ext) for ext in SUPPORTED_EXTENSIONS):
-                full_path = os.path.join(root, file)
+    # Iterative scandir walk: no per-entry stat beyond the dirent itself,
+    # and a single set lookup per filename instead of ~50 endswith calls
+    stack = [local_repo_path]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    # Skip .git and other hidden directories
+                    if not entry.name.startswith('.'):
+                        stack.append(entry.path)
+                    continue
+                if os.path.splitext(entry.name)[1] not in EXT_SET:
+                    continue
                 source_files.append({
-                    'name': file,
-                    'path': os.path.relpath(full_path, local_repo_path),
-                    'local_path': full_path
+                    'name': entry.name,
+                    'path': os.path.relpath(entry.path, local_repo_path),
+                    'local_path': entry.path
                 })
-            if len(source_files) >= max_files:
-                print(f"[WARN] Reached file limit of {max_files}. Some files may be excluded.", flush=True)
-                return source_files
+                if len(source_files) >= max_files:
+                    print(f"[WARN] Reached file limit of {max_files}. Some files may be excluded.", flush=True)
+                    return source_files
     return source_files
 
-def analyze_file(file_info):
-    """Read file content from local path and analyze it with lizard and git churn."""
+def _normalize_sizes(sizes, dx, dy):
+    """Scale sizes so they sum to the dx*dy layout area (vectorized)."""
+    sizes = np.asarray(sizes, dtype=float)
+    return sizes * (dx * dy / sizes.sum())
+
+
+def _squarify_layout(sizes, x, y, dx, dy):
+    """
+    Squarified-treemap layout of pre-normalized sizes, equivalent to
+    squarify.squarify but with the per-rectangle work vectorized.
+
+    Rows are still peeled off one at a time (there are only O(sqrt N) of
+    them), but the worst-aspect-ratio split decision uses cumulative numpy
+    reductions instead of re-laying-out every candidate prefix, and the
+    coordinates within a row come from one cumsum.
+
+    Returns four parallel arrays (xs, ys, widths, depths), one entry per
+    input size, in input order.
+    """
+    sizes = np.asarray(sizes, dtype=float)
+    xs, ys, widths, depths = [], [], [], []
+    start = 0
+    n = len(sizes)
+    while start < n:
+        remaining = sizes[start:]
+        horizontal = dx >= dy  # row is stacked along the shorter dy side
+        side = dy if horizontal else dx
+        if len(remaining) == 1:
+            count = 1
+        else:
+            # worst ratio of the first k items laid out in one row of fixed
+            # side length L is max(S_k^2/(L^2*min_k), L^2*max_k/S_k^2);
+            # the row ends at the first k where adding an item makes it worse
+            cumsum = np.cumsum(remaining)
+            running_min = np.minimum.accumulate(remaining)
+            running_max = np.maximum.accumulate(remaining)
+            sq = cumsum * cumsum
+            side_sq = side * side
+            worst = np.maximum(sq / (side_sq * running_min),
+                               (side_sq * running_max) / sq)
+            got_worse = worst[1:] > worst[:-1]
+            count = int(np.argmax(got_worse)) + 1 if got_worse.any() else len(remaining)
+
+        row = remaining[:count]
+        thickness = float(row.sum()) / side
+        lengths = row / thickness
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        if horizontal:
+            xs.append(np.full(count, x))
+            ys.append(y + starts)
+            widths.append(np.full(count, thickness))
+            depths.append(lengths)
+            x += thickness
+            dx -= thickness
+        else:
+            xs.append(x + starts)
+            ys.append(np.full(count, y))
+            widths.append(lengths)
+            depths.append(np.full(count, thickness))
+            y += thickness
+            dy -= thickness
+        start += count
+    if not xs:
+        return np.empty(0), np.empty(0), np.empty(0), np.empty(0)
+    return (np.concatenate(xs), np.concatenate(ys),
+            np.concatenate(widths), np.concatenate(depths))
+
+
+def _load_cached_metrics(key):
+    """Return cached lizard metrics for a content hash, or None on miss."""
     try:
-        with open(file_info['local_path'], 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
+        with open(os.path.join(CACHE_DIR, f"{key}.json"), 'rb') as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
 
-        if not content:
-            return None
 
-        lines = content.splitlines()
-        if not lines:
-            return None
+def _store_cached_metrics(key, metrics):
+    """Write lizard metrics for a content hash, atomically via os.replace."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{key}.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(metrics))
+    os.replace(tmp_path, path)
 
-        analysis = lizard.analyze_file(file_info['local_path'])
-        complexity = sum(f.cyclomatic_complexity for f in analysis.function_list) or 1
 
-        # Compute simple churn: number of commits touching this file
+def _compute_churn(file_info):
+    """Number of commits touching this file, per git log (0 on any failure)."""
+    churn = 0
+    try:
+        if REPO_ROOT:
+            # Use repo-root-relative POSIX-style path so git can resolve it
+            rel_path = file_info.get('path')
+            if not rel_path:
+                rel_path = os.path.relpath(file_info['local_path'], REPO_ROOT)
+            rel_path_git = rel_path.replace(os.sep, '/')
+
+            result = subprocess.run(
+                ['git', 'log', '--pretty=format:%H', '--', rel_path_git],
+                cwd=REPO_ROOT,
+                capture_output=True,
+                text=True,
+                timeout=60,
+            )
+            if result.returncode == 0:
+                churn = len([line for line in result.stdout.splitlines() if line.strip()])
+            else:
+                print(f"[DEBUG] git log failed for {rel_path_git}: {result.stderr}", flush=True)
+    except Exception as e:
+        print(f"[DEBUG] Error computing churn for {file_info.get('path')}: {e}", flush=True)
         churn = 0
-        try:
-            if REPO_ROOT:
-                # Use repo-root-relative POSIX-style path so git can resolve it
-                rel_path = file_info.get('path')
-                if not rel_path:
-                    rel_path = os.path.relpath(file_info['local_path'], REPO_ROOT)
-                rel_path_git = rel_path.replace(os.sep, '/')
-
-                result = subprocess.run(
-                    ['git', 'log', '--pretty=format:%H', '--', rel_path_git],
-                    cwd=REPO_ROOT,
-                    capture_output=True,
-                    text=True,
-                    timeout=60,
-                )
-                if result.returncode == 0:
-                    churn = len([line for line in result.stdout.splitlines() if line.strip()])
-                else:
-                    print(f"[DEBUG] git log failed for {rel_path_git}: {result.stderr}", flush=True)
-        except Exception as e:
-            print(f"[DEBUG] Error computing churn for {file_info.get('path')}: {e}", flush=True)
-            churn = 0
+    return churn
+
+
+def analyze_file(file_info):
+    """Read file content from local path and analyze it with lizard and git churn."""
+    try:
+        # Read raw bytes with a 1 MiB buffer: line counting and hashing work
+        # on the bytes directly, and we only decode on a cache miss
+        with open(file_info['local_path'], 'rb', buffering=1024 * 1024) as f:
+            content_bytes = f.read()
+
+        if not content_bytes:
+            return None
+
+        # C-level newline count instead of materializing a list of lines
+        line_count = content_bytes.count(b'\n') + 1
+
+        # Trivially small files (one-line __init__.py, re-exports, stubs)
+        # always come out at complexity 1, so skip tokenization — and the
+        # cache — entirely; churn is still computed below
+        if line_count < 4 or len(content_bytes) < 64:
+            return {
+                "name": file_info['name'],
+                "size": max(1, line_count),
+                "complexity": 1,
+                "churn": _compute_churn(file_info),
+            }
+
+        # Identical content always yields identical lizard metrics, so cache
+        # them by content hash and skip tokenization for unchanged files.
+        # Churn comes from git history, not content, so it is never cached.
+        key = hashlib.blake2b(content_bytes, digest_size=16).hexdigest()
+        metrics = _load_cached_metrics(key)
+        if metrics is None:
+            content = content_bytes.decode('utf-8', 'ignore')
+            # lizard re-reads the file when given a path; hand it the content
+            # we already have in memory instead
+            analysis = lizard.analyze_file.analyze_source_code(file_info['name'], content)
+            complexity = sum(f.cyclomatic_complexity for f in analysis.function_list) or 1
+            metrics = {"size": max(1, line_count), "complexity": complexity}
+            _store_cached_metrics(key, metrics)
 
         return {
             "name": file_info['name'],
-            "size": max(1, len(lines)),
-            "complexity": complexity,
-            "churn": churn,
+            "size": metrics["size"],
+            "complexity": metrics["complexity"],
+            "churn": _compute_churn(file_info),
         }
     except Exception as e:
         print(f"[DEBUG] Error analyzing {file_info['name']}: {e}", flush=True)
         return None
 
-def build_city_from_github(repo_url):
-    """Build city from GitHub repository."""
+def compute_city(repo_url):
+    """Build the city_data list for a GitHub repository, purely in memory."""
     if not GITHUB_TOKEN:
         print("[WARN] GITHUB_TOKEN environment variable not set. You may experience rate-limiting.", flush=True)
 
@@ -162,17 +326,21 @@ def build_city_from_github(repo_url):
             raise Exception("No analyzable source files found in repository.")
 
         files_to_render = []
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_to_file = {executor.submit(analyze_file, f): f for f in files}
-            for i, future in enumerate(as_completed(future_to_file)):
-                file_info = future_to_file[future]
-                print(f"[PRO] Analyzing [{i+1}/{len(files)}]: {file_info['path']}", flush=True)
-                try:
-                    result = future.result()
-                    if result:
-                        files_to_render.append(result)
-                except Exception as e:
-                    print(f"[ERROR] Exception analyzing {file_info['name']}: {e}", flush=True)
+        # lizard tokenization is GIL-bound, so fan out across processes;
+        # never spawn more workers than there are files, and size chunks to
+        # roughly four per worker so pickling is amortized without one slow
+        # chunk stalling the tail
+        workers = min(MAX_WORKERS, max(1, len(files)))
+        chunksize = max(1, len(files) // (workers * 4))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(local_repo_path,),
+        ) as executor:
+            for i, result in enumerate(executor.map(analyze_file, files, chunksize=chunksize)):
+                print(f"[PRO] Analyzing [{i+1}/{len(files)}]: {files[i]['path']}", flush=True)
+                if result:
+                    files_to_render.append(result)
 
         if not files_to_render:
             raise Exception("No analyzable files could be processed.")
@@ -184,44 +352,47 @@ def build_city_from_github(repo_url):
         if sum(sizes) == 0:
             sizes = [1] * len(files_to_render)
 
-        values = squarify.normalize_sizes(sizes, dynamic_area, dynamic_area)
-        rects = squarify.squarify(values, 0, 0, dynamic_area, dynamic_area)
-
-        city_data = []
-        for i, file_data in enumerate(files_to_render):
-            complexity = file_data['complexity']
-            if complexity <= 5:
-                color = "#00ffcc"
-            elif complexity <= 15:
-                color = "#00ff88"
-            elif complexity <= 30:
-                color = "#FFC300"
-            elif complexity <= 50:
-                color = "#ff9900"
-            else:
-                color = "#ff4444"
-
-            height = max(1, complexity * 2)
-
-            city_data.append({
-                "name": file_data['name'],
-                "x": rects[i]['x'], "y": rects[i]['y'],
-                "w": rects[i]['dx'], "d": rects[i]['dy'],
-                "h": height,
-                "color": color,
-                "size": file_data['size'],
-                "churn": file_data.get('churn', 0),
-            })
-
-        with open('city_data2.json', 'w') as f:
-            json.dump(city_data, f)
+        values = _normalize_sizes(sizes, dynamic_area, dynamic_area)
+        xs, ys, ws, ds = _squarify_layout(values, 0, 0, dynamic_area, dynamic_area)
+
+        # Classify all files at once: digitize does the bucket decision in C
+        # instead of four Python-level elif branches per file
+        complexities = np.fromiter(
+            (f['complexity'] for f in files_to_render), dtype=np.int64, count=num_files
+        )
+        colors = [COMPLEXITY_COLORS[i] for i in np.digitize(complexities, COMPLEXITY_BINS)]
+        heights = np.maximum(1, complexities * 2).tolist()
+
+        # Assemble from parallel arrays in one comprehension: no per-item
+        # enumerate/indexing, just a zip over the columns
+        names = [f['name'] for f in files_to_render]
+        file_sizes = [f['size'] for f in files_to_render]
+        churns = [f.get('churn', 0) for f in files_to_render]
+        city_data = [
+            {"name": n, "x": x, "y": y, "w": w, "d": d,
+             "h": h, "color": c, "size": s, "churn": ch}
+            for n, x, y, w, d, h, c, s, ch in zip(
+                names, xs.tolist(), ys.tolist(), ws.tolist(), ds.tolist(),
+                heights, colors, file_sizes, churns,
+            )
+        ]
+
         print(f"[PRO] City generated from {owner}/{repo}!", flush=True)
+        return city_data
     finally:
         if local_repo_path and os.path.exists(local_repo_path):
             print(f"[PRO] Cleaning up temporary directory: {local_repo_path}", flush=True)
             shutil.rmtree(local_repo_path, onerror=on_rm_error)
 
 
+def build_city_from_github(repo_url):
+    """Standalone entry point: compute the city and persist city_data2.json."""
+    city_data = compute_city(repo_url)
+    with open(os.path.join(BASE_DIR, 'city_data2.json'), 'wb') as f:
+        f.write(orjson.dumps(city_data))
+    return city_data
+
+
 def on_rm_error(func, path, exc_info):
     """
     Error handler for shutil.rmtree.
@@ -1,48 +1,39 @@
-import json
 import os
-import subprocess
-import sys
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import Any, Dict, List, Optional
 
+import scanner2
+
 from . import features, storage, model_server
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+SCAN_TIMEOUT_SECONDS = 300
+
 
 def run_scanner(repo_url: str, github_token: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Invoke scanner2.py for the given repo and return the parsed city_data list.
+    Run scanner2 in-process for the given repo and return the city_data list.
 
-    This preserves the existing behavior of writing city_data2.json to disk
-    while also giving us the in-memory list for downstream processing.
+    The scan runs in a worker thread so we can bound it with a timeout; the
+    result comes back in memory, with no subprocess fork, disk write or JSON
+    read-back.
     """
-    cmd = [sys.executable, "scanner2.py", repo_url]
-    if github_token:
-        cmd.append(github_token)
-
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        timeout=300,
-        cwd=BASE_DIR,
-    )
-
-    if result.returncode != 0:
-        error_msg = result.stderr if result.stderr else result.stdout
-        raise RuntimeError(f"Analysis failed: {error_msg}")
-
-    data_file = os.path.join(BASE_DIR, "city_data2.json")
-    if not os.path.exists(data_file):
-        raise FileNotFoundError(
-            "No data generated - check if repository has supported source files."
-        )
-
-    with open(data_file, "r") as f:
-        city_data = json.load(f)
-
-    return city_data
+    scanner2.set_github_token(github_token or os.environ.get("GITHUB_TOKEN"))
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        future = executor.submit(scanner2.compute_city, repo_url)
+        try:
+            return future.result(timeout=SCAN_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            raise RuntimeError(
+                f"Analysis failed: scan exceeded {SCAN_TIMEOUT_SECONDS} seconds"
+            )
+    finally:
+        executor.shutdown(wait=False)
 
 
 def analyze_and_store(